@@ -1,63 +1,130 @@
 from __future__ import annotations
 
+import asyncio
+import functools
+import ijson
+import itertools
+import logging
+import os
 import re
+import sys
 import time
-import ollama
 import json
-from datetime import date, timedelta
+import operator
+import numpy as np
+import orjson
+from ollama import AsyncClient
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import TypedDict, List, Dict, Any, Literal, Optional
+from typing import Annotated, TypedDict, List, Dict, Any, Literal, Optional
 
 from langgraph.graph import StateGraph, START, END
 
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+
+class _DeferredFlushHandler(logging.StreamHandler):
+    """StreamHandler that skips the per-record flush; call drain() to flush explicitly."""
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> None:
+        super().flush()
+
+
+def _drain_log() -> None:
+    for handler in logging.getLogger().handlers + log.handlers:
+        if isinstance(handler, _DeferredFlushHandler):
+            handler.drain()
+
 
 # ---------- 1) Define the shared State ----------
 class AgentState(TypedDict, total=False):
     run_date: str
     profile: Dict[str, Any]
-    jobs: List[Dict[str, Any]]          # jobs to evaluate
+    jobs_path: Optional[str]            # JSON file of jobs to evaluate, streamed by match_jobs_node
     matches: List[Dict[str, Any]]       # filled later by LLM
     rejected: List[Dict[str, Any]]      # filled later by LLM
-    stats: Dict[str, Any]
+    stats: Annotated[Dict[str, Any], operator.or_]   # nodes return only new keys; LangGraph merges them
 
 
 # ---------- 2) Helper functions ----------
+_BATCH_DESC_CHARS = 800     # per-job description budget inside a batched prompt
+_JD_CHARS = 3000            # description budget for a single-job prompt
+
+# Shared Ollama settings: deterministic, capped output, weights kept resident.
+# num_ctx must be the same for every request or Ollama reloads the model;
+# 8192 fits the profile plus a full batch and its answers.
+_KEEP_ALIVE = "30m"
+_NUM_PREDICT_PER_JOB = 256
+_LLM_OPTIONS = {"temperature": 0, "top_k": 1, "num_ctx": 8192}
+
+# Embedding pre-rank: jobs whose text is far from every skill group skip the LLM
+_EMBED_MODEL = "nomic-embed-text"
+_PRERANK_CHARS = 512
+_PRERANK_THRESHOLD = 0.35
+
+# Compiled once; matched case-insensitively so job text doesn't need lowering
+_YEARS_RE = re.compile(
+    r"(\d+)\s*\+\s*years|(\d+)\s*years\s+of\s+experience|minimum\s+(\d+)\s*years",
+    re.IGNORECASE,
+)
+
+# Senior keyword filter (fast reject without LLM)
+_SENIOR_RE = re.compile(r"(?:senior|lead|principal|staff|head\s+of)", re.IGNORECASE)
+
+
+def _set_today(today: date) -> None:
+    global _TODAY, _TODAY_STR, _YESTERDAY_STR, _NEXT_MIDNIGHT
+    _TODAY = today
+    _TODAY_STR = today.isoformat()
+    _YESTERDAY_STR = (today - timedelta(days=1)).isoformat()
+    _NEXT_MIDNIGHT = datetime.combine(today + timedelta(days=1), datetime.min.time()).timestamp()
+
+
+def _refresh_today() -> None:
+    # A float compare per call; only re-derives the date once a process crosses midnight
+    if time.time() >= _NEXT_MIDNIGHT:
+        _set_today(date.today())
+
+
 def _today_str() -> str:
-    return date.today().isoformat()
+    _refresh_today()
+    return _TODAY_STR
 
 
 def _yesterday_str() -> str:
-    return (date.today() - timedelta(days=1)).isoformat()
+    _refresh_today()
+    return _YESTERDAY_STR
+
+
+_set_today(date.today())
 
 
 def _read_json(path: Path) -> Any:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return orjson.loads(path.read_bytes())
 
 
 def _write_json(path: Path, data: Any) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    path.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
 
-def _safe_json_loads(text: str):
-    """
-    Try to parse JSON even if the model returns extra text.
-    Extract the first {...} block and parse it.
-    """
-    text = text.strip()
+def _iter_jobs(path: Path):
+    """Yield jobs from a JSON array file one at a time instead of loading the whole list."""
+    with open(path, "rb") as f:
+        yield from ijson.items(f, "item", use_float=True)
 
-    # Fast path: already clean JSON
-    try:
-        return json.loads(text)
-    except Exception:
-        pass
 
-    # Try extracting JSON object from messy output
-    m = re.search(r"\{.*\}", text, flags=re.DOTALL)
-    if not m:
-        raise ValueError("No JSON object found in model output.")
-    return json.loads(m.group(0))
+def _batched(items: List[Any], n: int):
+    """itertools.batched on Python 3.12+, islice fallback for older interpreters."""
+    if hasattr(itertools, "batched"):
+        yield from itertools.batched(items, n)
+        return
+    it = iter(items)
+    while chunk := tuple(itertools.islice(it, n)):
+        yield chunk
 
 
 def _estimate_required_years(job_text: str) -> int | None:
@@ -65,27 +132,18 @@ def _estimate_required_years(job_text: str) -> int | None:
     Very simple heuristic: look for patterns like '3+ years', '5 years of experience'.
     We'll use this only as a soft pre-filter.
     """
-    patterns = [
-        r"(\d+)\s*\+\s*years",
-        r"(\d+)\s*years\s+of\s+experience",
-        r"minimum\s+(\d+)\s*years"
-    ]
-    for p in patterns:
-        m = re.search(p, job_text.lower())
-        if m:
-            try:
-                return int(m.group(1))
-            except Exception:
-                return None
-    return None
+    m = _YEARS_RE.search(job_text)
+    if not m:
+        return None
+    return int(next(g for g in m.groups() if g))
 
 
-def llm_match_job_ollama(job: dict, profile: dict, model: str = "llama3.2:1b") -> dict:
+async def llm_match_job_ollama_async(client: AsyncClient, job: dict, profile: dict, model: str = "llama3.2:1b") -> dict:
     """
     Ask llama (via Ollama) to decide whether this job matches the profile.
     Return strict JSON dict with: match, score, reasons, red_flags.
     """
-    jd = job.get("description") or ""
+    jd = (job.get("description") or "")[:_JD_CHARS]
     title = job.get("title") or ""
     company = job.get("company") or ""
     location = job.get("location") or ""
@@ -127,18 +185,185 @@ JOB DESCRIPTION:
 {schema_instructions}
 """.strip()
 
-    resp = ollama.chat(
+    resp = await client.chat(
+        model=model,
+        messages=[
+            {"role": "system", "content": system},
+            {"role": "user", "content": user},
+        ],
+        format="json",
+        keep_alive=_KEEP_ALIVE,
+        options={**_LLM_OPTIONS, "num_predict": _NUM_PREDICT_PER_JOB},
+    )
+
+    return json.loads(resp["message"]["content"])
+
+
+async def llm_match_jobs_batch(client: AsyncClient, jobs_chunk: List[Dict[str, Any]], profile: dict,
+                               model: str = "llama3.2:1b") -> Dict[int, dict]:
+    """
+    Ask llama to evaluate several jobs in one request.
+    Return {position: decision} (0-based position in jobs_chunk) for every job the
+    model answered for; jobs missing from the answer are left for the caller to retry.
+    """
+    system = (
+        "You are an AI job-matching assistant. "
+        "You must output ONLY valid JSON and nothing else."
+    )
+
+    blocks = []
+    for n, job in enumerate(jobs_chunk, start=1):
+        jd = (job.get("description") or "")[:_BATCH_DESC_CHARS]
+        blocks.append(
+            f"[{n}]\n"
+            f"Title: {job.get('title') or ''}\n"
+            f"Company: {job.get('company') or ''}\n"
+            f"Description: {jd}"
+        )
+
+    schema_instructions = """
+Return ONLY JSON with exactly this shape, one entry per job, using the job's [number]:
+{
+  "results": [
+    {
+      "job": integer,
+      "match": "yes" or "no",
+      "score": integer from 0 to 100,
+      "reasons": [string, ...],
+      "red_flags": [string, ...]
+    }
+  ]
+}
+Rules:
+- Prefer technical skill match, relevant experience match, and role/title alignment.
+- Reject if the role is clearly senior/lead or requires high years of experience for an early-career profile.
+- Be concise: 2-5 reasons max, 0-5 red_flags max.
+"""
+
+    user = f"""
+CANDIDATE PROFILE (JSON):
+{json.dumps(profile, ensure_ascii=False)}
+
+JOBS:
+{chr(10).join(blocks)}
+
+{schema_instructions}
+""".strip()
+
+    resp = await client.chat(
         model=model,
         messages=[
             {"role": "system", "content": system},
             {"role": "user", "content": user},
         ],
-        # If your ollama version supports structured output, you can try:
-        # format="json"
+        format="json",
+        keep_alive=_KEEP_ALIVE,
+        options={**_LLM_OPTIONS, "num_predict": _NUM_PREDICT_PER_JOB * len(jobs_chunk)},
     )
 
-    content = resp["message"]["content"]
-    return _safe_json_loads(content)
+    # format="json" guarantees valid JSON, so no regex recovery is needed here
+    data = json.loads(resp["message"]["content"])
+    results = data.get("results", []) if isinstance(data, dict) else []
+
+    # Key by position, not job id: the same ad can appear twice in one batch.
+    # Drop the bookkeeping keys so batched decisions look like single-job ones.
+    by_pos: Dict[int, dict] = {}
+    for r in results:
+        if not isinstance(r, dict):
+            continue
+        try:
+            pos = int(r.get("job")) - 1
+        except (TypeError, ValueError):
+            continue
+        if 0 <= pos < len(jobs_chunk) and pos not in by_pos:
+            by_pos[pos] = {k: v for k, v in r.items() if k not in ("job", "id")}
+    return by_pos
+
+
+async def _prerank_scores(client: AsyncClient, jobs: List[Dict[str, Any]], profile: dict) -> Optional[List[float]]:
+    """
+    Cosine similarity between each job (title + start of description) and the
+    closest profile skill group, from one embedding call for all jobs.
+    Returns None if there is nothing to compare or the embedding model isn't available.
+    """
+    skills = profile.get("skills", {})
+    skill_texts = [", ".join(v) for v in skills.values() if isinstance(v, list) and v]
+    if not skill_texts:
+        return None
+
+    job_texts = [
+        f"{job.get('title') or ''}\n{(job.get('description') or '')[:_PRERANK_CHARS]}"
+        for job in jobs
+    ]
+    try:
+        resp = await client.embed(model=_EMBED_MODEL, input=skill_texts + job_texts)
+    except Exception:
+        return None
+
+    emb = np.asarray(resp["embeddings"], dtype=np.float32)
+    emb /= np.maximum(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12)
+    emb_profile, emb_jobs = emb[:len(skill_texts)], emb[len(skill_texts):]
+
+    return (emb_jobs @ emb_profile.T).max(axis=1).tolist()
+
+
+async def _gather(jobs: List[Dict[str, Any]], profile: dict, model: str = "llama3.2:1b",
+                  batch_size: int = 8) -> List[Any]:
+    """
+    Evaluate jobs in length-binned batches, running batches concurrently against a single Ollama client.
+    The semaphore caps in-flight requests so we don't queue more than the
+    server can run in parallel (match it with OLLAMA_NUM_PARALLEL).
+    Jobs the batch answer misses are retried one by one, and jobs the
+    embedding pre-rank scores below threshold never reach the LLM.
+    Returns one decision (or exception) per job, in input order.
+    """
+    client = AsyncClient()
+    sem = asyncio.Semaphore(int(os.getenv("OLLAMA_NUM_PARALLEL", 8)))
+
+    async def _one(job: dict) -> dict:
+        async with sem:
+            return await llm_match_job_ollama_async(client, job, profile, model=model)
+
+    async def _chunk(chunk: tuple) -> List[Any]:
+        try:
+            async with sem:
+                by_pos = await llm_match_jobs_batch(client, list(chunk), profile, model=model)
+        except Exception:
+            by_pos = {}
+
+        missing = [i for i in range(len(chunk)) if i not in by_pos]
+        retried = await asyncio.gather(*[_one(chunk[i]) for i in missing], return_exceptions=True)
+        by_pos.update(zip(missing, retried))
+
+        return [by_pos[i] for i in range(len(chunk))]
+
+    decisions: List[Any] = [None] * len(jobs)
+
+    scores = await _prerank_scores(client, jobs, profile)
+    candidates = list(range(len(jobs)))
+    if scores is not None:
+        candidates = []
+        for i, score in enumerate(scores):
+            if score > _PRERANK_THRESHOLD:
+                candidates.append(i)
+            else:
+                decisions[i] = {"match": "no", "score": 0,
+                                "reasons": ["Job text is not similar to any profile skill group."],
+                                "red_flags": [f"Low skill similarity ({score:.2f})"]}
+
+    # Bin jobs of similar description length together so one long JD
+    # doesn't hold up a batch of short ones; restore input order afterwards.
+    order = sorted(candidates, key=lambda i: len(jobs[i].get("description") or ""))
+    chunks = await asyncio.gather(*[_chunk(tuple(jobs[i] for i in c)) for c in _batched(order, batch_size)])
+
+    for i, decision in zip(order, (d for chunk in chunks for d in chunk)):
+        decisions[i] = decision
+
+    if scores is not None:
+        for decision, score in zip(decisions, scores):
+            if isinstance(decision, dict):
+                decision["prerank_score"] = round(score, 4)
+    return decisions
 
 # ---------- 3) Nodes ----------
 def load_profile_node(state: AgentState) -> AgentState:
@@ -146,10 +371,9 @@ def load_profile_node(state: AgentState) -> AgentState:
     profile = _read_json(profile_path)
 
     return {
-        **state,
         "run_date": state.get("run_date") or _today_str(),
         "profile": profile,
-        "stats": {**state.get("stats", {}), "profile_loaded": True},
+        "stats": {"profile_loaded": True},
     }
 
 
@@ -162,41 +386,44 @@ def load_jobs_node(state: AgentState) -> AgentState:
     jobs_path = data_dir / f"jobs_{run_date}.json"
 
     if new_jobs_path.exists():
-        jobs = _read_json(new_jobs_path)
-        source = str(new_jobs_path)
+        path = new_jobs_path
     elif jobs_path.exists():
-        jobs = _read_json(jobs_path)
-        source = str(jobs_path)
+        path = jobs_path
     else:
-        jobs = []
-        source = "NONE"
+        path = None
+
+    if path is None:
+        return {
+            "jobs_path": None,
+            "stats": {"jobs_source": "NONE", "jobs_loaded": 0},
+        }
+
+    # Only peek at the first job here; match_jobs_node streams the rest.
+    # An empty file (dedup found nothing new) is still the source, it just skips matching.
+    if next(_iter_jobs(path), None) is None:
+        return {
+            "jobs_path": None,
+            "stats": {"jobs_source": str(path), "jobs_loaded": 0},
+        }
 
     return {
-        **state,
-        "jobs": jobs,
-        "matches": state.get("matches", []),
-        "rejected": state.get("rejected", []),
-        "stats": {
-            **state.get("stats", {}),
-            "jobs_source": source,
-            "jobs_loaded": len(jobs),
-        },
+        "jobs_path": str(path),
+        "stats": {"jobs_source": str(path)},
     }
 
 
 def route_if_no_jobs(state: AgentState) -> Literal["match_jobs_node", "save_results_node"]:
     # Conditional routing: if nothing to evaluate, skip matching
-    jobs = state.get("jobs", [])
-    return "save_results_node" if len(jobs) == 0 else "match_jobs_node"
+    return "save_results_node" if not state.get("jobs_path") else "match_jobs_node"
 
 
 def match_jobs_node(state: AgentState) -> AgentState:
     """
-    For each job in state['jobs'], call llama (Ollama) and decide match/no-match.
+    Stream each job from state['jobs_path'], call llama (Ollama) and decide match/no-match.
     Adds results into state['matches'] and state['rejected'].
     """
     profile = state.get("profile", {})
-    jobs = state.get("jobs", [])
+    jobs_loaded = 0
 
     matches = []
     rejected = []
@@ -208,16 +435,15 @@ def match_jobs_node(state: AgentState) -> AgentState:
     except Exception:
         exp_threshold = 2
 
-    # Senior keyword filter (fast reject without LLM)
-    senior_keywords = ("senior", "lead", "principal", "staff", "head of")
+    to_llm = []
 
-    for idx, job in enumerate(jobs, start=1):
-        title = (job.get("title") or "").lower()
+    for job in _iter_jobs(Path(state["jobs_path"])):
+        jobs_loaded += 1
         jd = (job.get("description") or "")
         combined_text = f"{job.get('title','')}\n{jd}"
 
         # 1) quick rule-based skip for obvious senior titles
-        if any(k in title for k in senior_keywords):
+        if _SENIOR_RE.search(job.get("title") or ""):
             rejected.append({
                 **job,
                 "decision": {"match": "no", "score": 0,
@@ -237,12 +463,15 @@ def match_jobs_node(state: AgentState) -> AgentState:
             })
             continue
 
-        # 3) LLM decision
-        try:
-            decision = llm_match_job_ollama(job, profile, model="llama3.2:1b")
-        except Exception as e:
+        to_llm.append(job)
+
+    # 3) LLM decisions, run concurrently
+    results = asyncio.run(_gather(to_llm, profile, model="llama3.2:1b")) if to_llm else []
+
+    for idx, (job, decision) in enumerate(zip(to_llm, results), start=1):
+        if isinstance(decision, BaseException):
             # If parsing/model fails, reject safely but record error
-            decision = {"match": "no", "score": 0, "reasons": ["LLM evaluation failed."], "red_flags": [str(e)]}
+            decision = {"match": "no", "score": 0, "reasons": ["LLM evaluation failed."], "red_flags": [str(decision)]}
 
         record = {**job, "decision": decision}
 
@@ -251,18 +480,14 @@ def match_jobs_node(state: AgentState) -> AgentState:
         else:
             rejected.append(record)
 
-        # small delay so you don't hammer your local model
-        time.sleep(0.1)
-
-        # Optional: progress print
-        print(f"[match] {idx}/{len(jobs)} -> {decision.get('match')} (score={decision.get('score')})")
+        # Optional: progress log
+        log.info("[match] %d/%d -> %s (score=%s)", idx, len(to_llm), decision.get("match"), decision.get("score"))
 
     return {
-        **state,
         "matches": matches,
         "rejected": rejected,
         "stats": {
-            **state.get("stats", {}),
+            "jobs_loaded": jobs_loaded,
             "matching_ran": True,
             "matches_count": len(matches),
             "rejected_count": len(rejected),
@@ -284,16 +509,20 @@ def save_results_node(state: AgentState) -> AgentState:
 
     _write_json(out_path, payload)
 
+    # Progress lines are buffered; write them out before the summary
+    _drain_log()
     print("\n[LangGraph Agent] Run complete")
     print(f"  Date: {run_date}")
     print(f"  Jobs loaded: {state.get('stats', {}).get('jobs_loaded', 0)}")
     print(f"  Output: {out_path}")
 
-    return state
+    return {}
 
 
 # ---------- 4) Build the graph ----------
+@functools.lru_cache(maxsize=1)
 def build_graph():
+    """Build and compile the agent graph once per process; later calls reuse it."""
     graph = StateGraph(AgentState)
 
     graph.add_node("load_profile_node", load_profile_node)
@@ -321,5 +550,12 @@ def build_graph():
 
 
 if __name__ == "__main__":
+    # Progress lines go into stdout's own buffer instead of being flushed one at a time
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(message)s",
+        handlers=[_DeferredFlushHandler(sys.stdout)],
+    )
     app = build_graph()
     app.invoke({"run_date": _today_str()})
+    _drain_log()
@@ -1,4 +1,5 @@
-import json
+import ijson
+import orjson
 from datetime import datetime, timedelta
 from pathlib import Path
 
@@ -7,15 +8,26 @@ def load_jobs(file_path):
     """Load jobs from JSON file. Return empty list if file does not exist."""
     if not file_path.exists():
         return []
-    with open(file_path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return orjson.loads(file_path.read_bytes())
+
+
+def load_job_ids(file_path):
+    """Stream only the non-empty job ids from a JSON file. Return empty set if file does not exist."""
+    if not file_path.exists():
+        return frozenset()
+    with open(file_path, "rb") as f:
+        return frozenset(filter(None, ijson.items(f, "item.id")))
 
 
 def save_jobs(file_path, jobs):
     """Save jobs to a JSON file."""
     file_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(jobs, f, indent=2, ensure_ascii=False)
+    file_path.write_bytes(orjson.dumps(jobs, option=orjson.OPT_INDENT_2))
+
+
+def filter_new_jobs(today_jobs, yesterday_ids):
+    """Return today's jobs whose id is not in yesterday_ids, keeping their order."""
+    return [job for job in today_jobs if job.get("id") not in yesterday_ids]
 
 
 def deduplicate_jobs():
@@ -29,16 +41,12 @@ def deduplicate_jobs():
 
     # Load jobs
     today_jobs = load_jobs(today_file)
-    yesterday_jobs = load_jobs(yesterday_file)
 
-    # Create set of yesterday job IDs
-    yesterday_ids = {job.get("id") for job in yesterday_jobs if job.get("id")}
+    # Only yesterday's ids are needed, so don't build its job dicts
+    yesterday_ids = load_job_ids(yesterday_file)
 
     # Filter new jobs
-    new_jobs = [
-        job for job in today_jobs
-        if job.get("id") not in yesterday_ids
-    ]
+    new_jobs = filter_new_jobs(today_jobs, yesterday_ids)
 
     # Save new jobs
     save_jobs(new_jobs_file, new_jobs)
@@ -1,10 +1,60 @@
+import asyncio
+import httpx
 import requests
-import json
+import orjson
 from datetime import datetime, timezone
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 
 
 BASE_URL = "https://jobsearch.api.jobtechdev.se/search"
+MAX_OFFSET = 2000  # the search API rejects offsets above this
+MAX_CONCURRENT_PAGES = 4
+
+# Retry policy shared by the sync session and the async page fetches
+RETRIES = 3
+BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def _make_session():
+    """One keep-alive session for all pages, retrying transient API errors."""
+    session = requests.Session()
+    retry = Retry(total=RETRIES, backoff_factor=BACKOFF_FACTOR, status_forcelist=RETRY_STATUSES)
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=4, pool_maxsize=8)
+    session.mount("https://", adapter)
+    return session
+
+
+_SESSION = _make_session()
+
+
+async def _fetch_page(client, sem, params, offset):
+    """Fetch one page, retrying 429/5xx and connection errors like the sync session does."""
+    for attempt in range(RETRIES + 1):
+        last = attempt == RETRIES
+        async with sem:
+            try:
+                r = await client.get(BASE_URL, params={**params, "offset": offset})
+            except httpx.TransportError:
+                if last:
+                    raise
+            else:
+                if last or r.status_code not in RETRY_STATUSES:
+                    r.raise_for_status()
+                    return r.json()
+
+        # Back off outside the semaphore so a waiting retry doesn't hold a slot
+        await asyncio.sleep(BACKOFF_FACTOR * 2 ** attempt)
+
+
+async def _fetch_pages(params, offsets):
+    """Fetch the remaining pages concurrently over one HTTP/2 connection."""
+    # Cap in-flight requests so we don't burst the public API with every page at once
+    sem = asyncio.Semaphore(MAX_CONCURRENT_PAGES)
+    async with httpx.AsyncClient(http2=True, timeout=30) as client:
+        return await asyncio.gather(*[_fetch_page(client, sem, params, o) for o in offsets])
 
 
 def fetch_ai_jobs_today():
@@ -15,37 +65,50 @@ def fetch_ai_jobs_today():
     }
 
     today = datetime.now(timezone.utc).date()
+    today_str = today.isoformat()
     today_jobs = []
 
-    while True:
-        response = requests.get(BASE_URL, params=params)
-        response.raise_for_status()
-        data = response.json()
+    # Let the API drop older ads and return the newest first
+    params["published-after"] = f"{today_str}T00:00:00"
+    params["sort"] = "pubdate-desc"
+
+    # First page synchronously: it tells us how many hits there are in total
+    response = _SESSION.get(BASE_URL, params=params, timeout=30)
+    response.raise_for_status()
+    data = response.json()
+
+    hits = data.get("hits", [])
+    total = (data.get("total") or {}).get("value", 0)
+    offsets = range(params["limit"], min(total, MAX_OFFSET + 1), params["limit"])
 
-        hits = data.get("hits", [])
-        if not hits:
-            break
+    # Newest-first: once the first page reaches older ads, later pages can't hold today's
+    reached_older = bool(hits) and (hits[-1].get("publication_date") or "")[:10] < today_str
 
-        for job in hits:
+    pages = [data]
+    if offsets and not reached_older:
+        pages += asyncio.run(_fetch_pages(params, offsets))
+
+    for page in pages:
+        for job in page.get("hits", []):
             pub_date_str = job.get("publication_date")
             if not pub_date_str:
                 continue
 
-            pub_date = datetime.fromisoformat(pub_date_str).date()
-
-            if pub_date == today:
+            # publication_date is ISO "YYYY-MM-DDTHH:MM:SS", so the date is its first 10 chars
+            if pub_date_str[:10] == today_str:
+                emp = job.get("employer") or {}
+                desc = job.get("description") or {}
+                addr = job.get("workplace_address") or {}
                 today_jobs.append({
                     "id": job.get("id"),
                     "title": job.get("headline"),
-                    "company": job.get("employer", {}).get("name"),
-                    "description": job.get("description", {}).get("text"),
-                    "location": job.get("workplace_address", {}).get("municipality"),
+                    "company": emp.get("name"),
+                    "description": desc.get("text"),
+                    "location": addr.get("municipality"),
                     "url": job.get("webpage_url"),
                     "published_at": pub_date_str
                 })
 
-        params["offset"] += params["limit"]
-
     return today_jobs, today
 
 
@@ -55,9 +118,7 @@ def save_jobs_to_file(jobs, date):
 
     file_path = data_dir / f"jobs_{date}.json"
 
-
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(jobs, f, indent=2, ensure_ascii=False)
+    file_path.write_bytes(orjson.dumps(jobs, option=orjson.OPT_INDENT_2))
 
     return file_path
 